@@ -0,0 +1,296 @@
+"""Incremental scanner that separates streamed LLM text from XML tool calls.
+
+The scanner holds no agent state; Agent.run_stream only adapts its events.
+"""
+
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple, Union
+
+TEXT = "text"
+TOOL_CALL = "tool_call"
+
+# Streamed parameter text is emitted in runs of at least this many characters
+# unless a whitespace boundary is reached first
+STREAM_BATCH_SIZE = 32
+
+
+class ToolCallScan:
+    """A complete tool-call block found in the stream."""
+
+    def __init__(
+        self,
+        tool_name: str,
+        params: Optional[Dict[str, str]],
+        raw_xml: str,
+        block: str,
+    ) -> None:
+        # Name from the opening tag
+        self.tool_name = tool_name
+        # Parameters parsed while streaming, or None if the block must be re-parsed
+        self.params = params
+        # The block from the opening tag to the closing tag
+        self.raw_xml = raw_xml
+        # Everything from the opening tag on, for the fallback parser
+        self.block = block
+
+
+ScanEvent = Tuple[str, Union[str, ToolCallScan]]
+
+
+class StreamScanner:
+    """Split streamed chunks into text to emit and complete tool-call blocks.
+
+    Text is passed through until a '<' is seen; the scanner then holds text
+    back until it either recognises an opening tool tag or no '<' is left near
+    enough to the end to start one, and then flushes it as text. Tool tags
+    are matched over the previous tail plus the new chunk only, and the tool
+    block is fed to a pull parser as it streams in.
+    """
+
+    def __init__(
+        self,
+        tag_pattern: Optional[re.Pattern],
+        stream_tags: Dict[str, str],
+        max_tag_len: int,
+    ) -> None:
+        self._tag_pattern = tag_pattern
+        self._stream_tags = stream_tags
+        self._max_tag_len = max_tag_len
+
+        # The response is kept as a list of parts and only joined when needed
+        self._parts: List[str] = []
+        self._length = 0
+        self._tail = ""
+
+        self.halted = False
+        self.in_tool = False
+        self._halted_parts: List[str] = []
+        # Position in the response where the held-back text starts
+        self._halt_start = 0
+
+        self._tool_start = 0
+        self._tool_name: Optional[str] = None
+        self._tool_parser: Optional[ET.XMLPullParser] = None
+        self._tool_depth = 0
+        # Top-level parameters of the current tool call completed so far
+        self._tool_params: Dict[str, str] = {}
+        self._fed_pos = 0
+
+        ## New experimental feature: streaming tool responses
+        self._tool_streaming = False
+        self._stream_param_tag: Optional[str] = None
+        self._stream_param_open = False
+        self._stream_pos = 0
+        self._stream_buf: List[str] = []
+        self._stream_buf_len = 0
+
+    @property
+    def tool_name(self) -> Optional[str]:
+        """Name of the tool call being streamed, or None outside a tool call."""
+        return self._tool_name if self.in_tool else None
+
+    def partial_params(self) -> Optional[Dict[str, str]]:
+        """Return the parameters of the current tool call closed so far.
+
+        Returns None outside a tool call or when the block could not be parsed.
+        """
+        if not self.in_tool or self._tool_parser is None:
+            return None
+        return self._tool_params
+
+    def text(self) -> str:
+        """Return the full response received so far."""
+        return "".join(self._parts)
+
+    def pending(self) -> str:
+        """Return the text held back since the last halt."""
+        return "".join(self._halted_parts)
+
+    def feed(self, content: str) -> List[ScanEvent]:
+        """Consume one streamed chunk and return the events it completes."""
+        events: List[ScanEvent] = []
+
+        # Without tools there is no tag to wait for, so never hold text back
+        if self._tag_pattern is None:
+            self._parts.append(content)
+            self._length += len(content)
+            events.append((TEXT, content))
+            return events
+
+        # Only the tail that may still hold a partial tag needs rescanning
+        window_start = self._length - len(self._tail)
+        window = self._tail + content
+        self._tail = window[-self._max_tag_len :]
+        self._parts.append(content)
+        self._length += len(content)
+
+        if not self.halted:
+            lt = content.find("<")
+            # Normal response when no tag can start in this chunk
+            if lt == -1:
+                events.append((TEXT, content))
+                return events
+            # Emit the text before the '<' and hold back the rest
+            if lt:
+                events.append((TEXT, content[:lt]))
+            self.halted = True
+            self._halt_start = self._length - len(content) + lt
+            self._halted_parts.append(content[lt:])
+        else:
+            # Accumulate after halt
+            self._halted_parts.append(content)
+
+        # Detect opening and closing tool tags in the unscanned tail
+        close_found = False
+        close_end = self._length
+        for match in self._tag_pattern.finditer(window):
+            if not self.in_tool and not match.group(1):
+                start = window_start + match.start()
+                self._release_before(start, events)
+                self._open_tool(match.group(2), start)
+            elif self.in_tool and match.group(1):
+                close_found = True
+                close_end = window_start + match.end()
+                if match.group(2) != self._tool_name:
+                    self._tool_parser = None
+                break
+
+        if not self.in_tool:
+            # Flush the buffer once no '<' is close enough to the end to still
+            # start a tool tag
+            if "<" not in self._tail:
+                events.append((TEXT, self.pending()))
+                self.halted = False
+                self._halted_parts = []
+            return events
+
+        if self._tool_parser is not None:
+            try:
+                self._tool_parser.feed(
+                    window[self._fed_pos - window_start : close_end - window_start]
+                )
+                self._read_params()
+            except ET.ParseError:
+                # Leave it to the fallback parser, which reports the error
+                self._tool_parser = None
+            self._fed_pos = close_end
+
+        if self._tool_streaming:
+            self._stream_param(window, window_start, events)
+
+        if close_found:
+            self.in_tool = False
+            self._flush_stream_buf(events)
+            events.append((TOOL_CALL, self._close_tool(close_end)))
+            self._resume_after(close_end, events)
+        return events
+
+    def _resume_after(self, close_end: int, events: List[ScanEvent]) -> None:
+        """Treat what followed a closed tool call like freshly received text."""
+        rest = self.text()[close_end:]
+        self._halted_parts = []
+        self.halted = False
+        lt = rest.find("<")
+        if lt == -1:
+            if rest:
+                events.append((TEXT, rest))
+            return
+        if lt:
+            events.append((TEXT, rest[:lt]))
+        self.halted = True
+        self._halt_start = close_end + lt
+        self._halted_parts.append(rest[lt:])
+
+    def _stream_param(
+        self, window: str, window_start: int, events: List[ScanEvent]
+    ) -> None:
+        """Emit the body of the tool's stream parameter as it arrives."""
+        if not self._stream_param_open:
+            tag = self._stream_param_tag or ""
+            idx = window.find(tag, max(self._tool_start - window_start, 0))
+            if idx == -1:
+                return
+            self._stream_param_open = True
+            self._stream_pos = window_start + idx + len(tag)
+
+        body = window[self._stream_pos - window_start :]
+        close = body.find("</")
+        if close != -1:
+            body = body[:close]
+            self._tool_streaming = False
+        elif body.endswith("<"):
+            # May be the start of the closing tag; decide on the next chunk
+            body = body[:-1]
+        self._stream_pos += len(body)
+
+        if body:
+            self._stream_buf.append(body)
+            self._stream_buf_len += len(body)
+        if (
+            not self._tool_streaming
+            or self._stream_buf_len >= STREAM_BATCH_SIZE
+            or (body and not body.strip())
+        ):
+            self._flush_stream_buf(events)
+
+    def flush(self) -> List[ScanEvent]:
+        """Return streamed parameter text still batched when the stream ends."""
+        events: List[ScanEvent] = []
+        self._flush_stream_buf(events)
+        return events
+
+    def _flush_stream_buf(self, events: List[ScanEvent]) -> None:
+        if self._stream_buf:
+            events.append((TEXT, "".join(self._stream_buf)))
+            self._stream_buf = []
+            self._stream_buf_len = 0
+
+    def _release_before(self, start: int, events: List[ScanEvent]) -> None:
+        """Emit the held-back text before a tool tag and keep only the rest."""
+        pending = self.pending()
+        offset = start - self._halt_start
+        if offset > 0:
+            events.append((TEXT, pending[:offset]))
+            self._halted_parts = [pending[offset:]]
+            self._halt_start = start
+
+    def _open_tool(self, tool_name: str, start: int) -> None:
+        self.in_tool = True
+        self._tool_name = tool_name
+        self._tool_start = self._fed_pos = start
+        self._tool_parser = ET.XMLPullParser(events=("start", "end"))
+        self._tool_depth = 0
+        self._tool_params = {}
+        self._stream_param_tag = self._stream_tags.get(tool_name)
+        self._tool_streaming = self._stream_param_tag is not None
+
+    def _read_params(self) -> None:
+        """Collect the top-level children the pull parser has finished."""
+        if self._tool_parser is None:
+            return
+        for event, elem in self._tool_parser.read_events():
+            if event == "start":
+                self._tool_depth += 1
+            else:
+                self._tool_depth -= 1
+                if self._tool_depth == 1:
+                    self._tool_params[elem.tag] = elem.text.strip() if elem.text else ""
+
+    def _close_tool(self, close_end: int) -> ToolCallScan:
+        block = self.text()[self._tool_start :]
+        params: Optional[Dict[str, str]] = None
+        if self._tool_parser is not None:
+            try:
+                self._tool_parser.close()
+                self._read_params()
+                params = self._tool_params
+            except ET.ParseError:
+                params = None
+            self._tool_parser = None
+        return ToolCallScan(
+            self._tool_name or "",
+            params,
+            block[: close_end - self._tool_start],
+            block,
+        )
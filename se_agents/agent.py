@@ -1,13 +1,43 @@
-import inspect
+import asyncio
+import contextlib
+import functools
+import hashlib
+import json
+import logging
+import os
+import random
 import re
+import time
+import weakref
 import xml.etree.ElementTree as ET
-from pprint import pprint
-from typing import AsyncGenerator, Dict, List, Optional, Union
+from collections import OrderedDict, deque
+from itertools import islice
+from types import SimpleNamespace
+from typing import (
+    AsyncGenerator,
+    Deque,
+    Dict,
+    List,
+    MutableMapping,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import asyncer
-from openai import AsyncOpenAI
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+try:
+    import tiktoken
+except ImportError:  # Optional: token counts fall back to word counts
+    tiktoken = None
 
+from se_agents._stream_parser import TEXT, StreamScanner, ToolCallScan
 from se_agents.schemas import (
+    TOOL_RESPONSE_PREFIX,
+    TOOL_RESPONSE_SUFFIX,
+    EventType,
     ResponseEvent,
     TextResponseEvent,
     ToolCallResponseEvent,
@@ -17,7 +47,228 @@ from se_agents.schemas import (
 from se_agents.system_prompt import build_system_prompt
 from se_agents.tools import OpenAIVisionTool, Tool, VisionBaseTool
 
+logger = logging.getLogger(__name__)
+
 TOKEN_LIMIT = 80000
+# Older tool responses longer than this many characters are cut down to their
+# head and tail before whole messages are dropped from the context
+TOOL_RESPONSE_KEEP = 2000
+# Most cacheable tool results kept per agent before the oldest are dropped
+TOOL_CACHE_SIZE = 256
+
+# Connection pool for the OpenAI client. Idle connections are kept alive long
+# enough to survive a tool execution between two turns, so follow-up requests
+# reuse the open connection instead of paying a new TLS handshake.
+HTTP_LIMITS = httpx.Limits(
+    max_connections=1000, max_keepalive_connections=200, keepalive_expiry=60.0
+)
+HTTP_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+# Retries for rate-limit, timeout, connection and 5xx errors. The OpenAI client
+# backs off exponentially with jitter and honours Retry-After headers.
+MAX_RETRIES = 5
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding(model: Optional[str]):
+    """Return the tiktoken encoding for a model, or None to fall back to words.
+
+    tiktoken downloads the encoding file on first use, so the first call for an
+    encoding may block on network I/O; the result is cached per process.
+    """
+    if tiktoken is None or model is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Unknown or non-OpenAI model: the current OpenAI encoding is a close estimate
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            return None
+    except Exception:
+        # The encoding files could not be loaded (e.g. offline)
+        return None
+
+
+def _count_text_tokens(text: str, encoding=None) -> int:
+    """Count tokens with the encoding, or whitespace-separated words without one."""
+    if encoding is None:
+        return len(text.split())
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _count_message_tokens(message: Dict, encoding=None) -> int:
+    """Count the tokens in a message's content, including multimodal content lists.
+
+    Uses the given tiktoken encoding for text, or words when it is None. Image
+    URLs are always counted as words so base64 data URLs are not encoded.
+    """
+    content = message["content"]
+    if isinstance(content, str):
+        return _count_text_tokens(content, encoding)
+    # e.g. None for assistant messages that only carry tool calls
+    if not isinstance(content, list):
+        return 0
+
+    count = 0
+    for part in content:
+        if part["type"] == "text":
+            count += _count_text_tokens(part["text"], encoding)
+        elif part["type"] == "image_url":
+            count += len(part["image_url"]["url"].split())
+    return count
+
+
+# Inserted by _trim_tool_response in place of the removed middle of a response
+_TRUNCATION_MARKER = re.compile(r"\n\.\.\.\[truncated \d+ characters\]\.\.\.\n")
+
+
+def _trim_tool_response(content: str, keep: int) -> Optional[str]:
+    """Cut a long tool response down to `keep` characters of head and tail.
+
+    Returns None when the content is not a tool response, was already trimmed,
+    or would not get shorter.
+    """
+    prefix, suffix = TOOL_RESPONSE_PREFIX, TOOL_RESPONSE_SUFFIX
+    if not (content.startswith(prefix) and content.endswith(suffix)):
+        return None
+    body = content[len(prefix) : -len(suffix)]
+    if _TRUNCATION_MARKER.search(body):
+        return None
+    removed = len(body) - keep
+    marker = f"\n...[truncated {removed} characters]...\n"
+    if removed <= len(marker):
+        return None
+    head_len = keep // 2
+    head, tail = body[:head_len], body[len(body) - (keep - head_len) :]
+    return f"{prefix}{head}{marker}{tail}{suffix}"
+
+
+def _build_image_message(user_input: str, image_urls: List[str]) -> Dict:
+    """Build a multimodal user message with the text followed by each image."""
+    content = [{"type": "text", "text": user_input}]
+    content.extend(
+        {"type": "image_url", "image_url": {"url": url}} for url in image_urls
+    )
+    return {"role": "user", "content": content}
+
+
+def _with_cache_control(message: Dict) -> Dict:
+    """Return a copy of the message marked as an ephemeral prompt-cache breakpoint.
+
+    Anthropic-compatible endpoints cache the whole prefix up to the last content
+    part carrying ``cache_control``; string content is converted to a text part.
+    """
+    content = message["content"]
+    if isinstance(content, str):
+        parts = [{"type": "text", "text": content}]
+    else:
+        parts = list(content)
+    parts[-1] = {**parts[-1], "cache_control": {"type": "ephemeral"}}
+    return {**message, "content": parts}
+
+
+# Clients per event loop, keyed by (api_key, base_url, max_retries). Pooled
+# connections belong to the loop that opened them, so sharing stops there.
+_CLIENTS = weakref.WeakKeyDictionary()
+
+
+def _shared_client(
+    api_key: Optional[str], base_url: Optional[str], max_retries: int
+) -> AsyncOpenAI:
+    """Return an OpenAI client with the tuned connection pool.
+
+    Agents created inside the same running event loop with the same credentials
+    share one client, so they reuse its open connections instead of each
+    paying for new TLS handshakes. Outside a running loop a new client is made.
+    """
+
+    def new_client() -> AsyncOpenAI:
+        return AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=DefaultAsyncHttpxClient(
+                limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT
+            ),
+            max_retries=max_retries,
+        )
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return new_client()
+    clients = _CLIENTS.setdefault(loop, {})
+    key = (api_key, base_url, max_retries)
+    if key not in clients:
+        clients[key] = new_client()
+    return clients[key]
+
+
+# Writes the debug output of verbose=True agents to stderr, without changing
+# the module logger's level or handlers
+_VERBOSE_HANDLER = logging.StreamHandler()
+
+
+# Shared SE_AGENTS_MAX_INFLIGHT limits, one per event loop
+_DEFAULT_SEMAPHORES = weakref.WeakKeyDictionary()
+
+
+def _loop_semaphore(
+    semaphores: weakref.WeakKeyDictionary, limit: int
+) -> asyncio.Semaphore:
+    """Return the semaphore for the running event loop, creating it on first use.
+
+    A semaphore that has waited is bound to its loop, so each loop needs its own.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = semaphores.get(loop)
+    if semaphore is None:
+        semaphore = semaphores[loop] = asyncio.Semaphore(limit)
+    return semaphore
+
+
+def _default_concurrency() -> Optional[asyncio.Semaphore]:
+    """Return the process-wide completion limit set by SE_AGENTS_MAX_INFLIGHT."""
+    limit = os.environ.get("SE_AGENTS_MAX_INFLIGHT")
+    return _loop_semaphore(_DEFAULT_SEMAPHORES, int(limit)) if limit else None
+
+
+def _freeze(value):
+    """Turn list prompt config into a tuple so it can be part of a cache key."""
+    return tuple(value) if isinstance(value, list) else value
+
+
+def _tool_prompt_key(tool: Tool) -> tuple:
+    """Return the parts of a tool that end up in the system prompt, in order."""
+    return (
+        tool.name,
+        tool.description,
+        tuple(
+            (name, param.get("description", ""), param.get("required", False))
+            for name, param in tool.parameters.items()
+        ),
+    )
+
+
+@functools.lru_cache(maxsize=128)
+def _cached_system_prompt(tool_keys: tuple, **config) -> str:
+    """Build the system prompt once per distinct tool set and prompt config."""
+    tools = [
+        SimpleNamespace(
+            name=name,
+            description=description,
+            parameters={
+                param: {"description": param_description, "required": required}
+                for param, param_description, required in params
+            },
+        )
+        for name, description, params in tool_keys
+    ]
+    config = {
+        key: list(value) if isinstance(value, tuple) else value
+        for key, value in config.items()
+    }
+    return build_system_prompt(tools=tools, **config)
 
 
 class Agent:
@@ -26,12 +277,19 @@ class Agent:
         # Core agent config
         name: str = None,
         token_limit: int = TOKEN_LIMIT,
+        tool_response_keep: int = TOOL_RESPONSE_KEEP,
         # OpenAI config
         api_key: str = None,
         model: str = None,
         base_url: str = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+        concurrency_limit: Union[int, asyncio.Semaphore, None] = None,
+        max_retries: int = MAX_RETRIES,
+        response_cache: Optional[MutableMapping[str, str]] = None,
         # Tool config
         tools: List[Tool] = None,
+        tool_cache_epsilon: float = 0.05,
+        tool_cache_size: int = TOOL_CACHE_SIZE,
         # Prompt config
         description: Union[str, None] = None,
         rules: Union[str, List[str], None] = None,
@@ -46,12 +304,14 @@ class Agent:
         add_final_output_instructions: bool = False,
         # Message config
         initial_messages: Optional[List[Dict[str, str]]] = None,
+        use_prompt_cache: Optional[bool] = None,
         # Verbose config
         verbose: bool = False,
     ):
         # Core agent config
         self.name = name
         self.token_limit = token_limit
+        self.tool_response_keep = tool_response_keep
 
         # Verbose config
         self.verbose = verbose
@@ -60,10 +320,36 @@ class Agent:
         self.api_key = api_key
         self.model = model
         self.base_url = base_url
-        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+        if http_client is None:
+            self.client = _shared_client(api_key, base_url, max_retries)
+        else:
+            self.client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=http_client,
+                max_retries=max_retries,
+            )
+        # Completed responses keyed by a hash of the request; any mapping works,
+        # e.g. a dict for tests or a disk-backed store shared between runs
+        self.response_cache = response_cache
+        # Bounds in-flight completion requests; pass a Semaphore to share the
+        # bound between agents. Without one, agents share the process-wide
+        # limit from SE_AGENTS_MAX_INFLIGHT when it is set. Integer limits get
+        # one semaphore per event loop, created when a request is first made.
+        self._concurrency = concurrency_limit
+        self._semaphores = weakref.WeakKeyDictionary()
 
         # Tool config
         self.tools = tools or []
+        self._index_tools()
+        # Results of cacheable tools: (name, params) -> (result, timestamp),
+        # in least recently used order and bounded by tool_cache_size.
+        # A fraction epsilon of hits re-runs the tool to keep entries fresh.
+        self._tool_cache: "OrderedDict[tuple, Tuple[str, float]]" = OrderedDict()
+        self.tool_cache_size = tool_cache_size
+        self.tool_cache_epsilon = tool_cache_epsilon
+        # Tool run started while the call was streaming: (name, params, task)
+        self._prefetch: Optional[Tuple[str, Dict[str, str], asyncio.Task]] = None
 
         # Prompt config
         self._custom_description = description
@@ -78,41 +364,118 @@ class Agent:
         self.add_final_output_instructions = add_final_output_instructions
 
         # Message config
-        system_message = self._add_system_prompt()
+        if use_prompt_cache is None:
+            # Anthropic only caches explicitly marked prefixes; OpenAI needs no markers
+            use_prompt_cache = bool(base_url) and "anthropic.com" in base_url
+        self.use_prompt_cache = use_prompt_cache
+        self._system_message = self._add_system_prompt()
+        if initial_messages and use_prompt_cache:
+            # Second cache breakpoint so the semi-static initial context is reused too
+            initial_messages = initial_messages[:-1] + [
+                _with_cache_control(initial_messages[-1])
+            ]
+        # A deque so truncation drops the oldest messages in O(1)
+        self.messages: Deque[Dict[str, str]] = deque([self._system_message])
         if initial_messages:
-            self.messages: List[Dict[str, str]] = [system_message] + initial_messages
-        else:
-            self.messages: List[Dict[str, str]] = [system_message]
+            self.messages.extend(initial_messages)
+        # Per-message token counts, kept in step with self.messages
+        self._encoding = _get_encoding(model)
+        self._message_tokens: Deque[int] = deque(
+            _count_message_tokens(msg, self._encoding) for msg in self.messages
+        )
+        self._token_count = sum(self._message_tokens)
 
         # Debug output
-        if self.verbose:
-            print("--- Initial System Prompt (Processed) ---")
-            print(self.messages[0]["content"])
-            print("---------------------------------------")
-            if initial_messages:
-                print("--- Initial Conversation Context ---")
-                for msg in self.messages[1:]:
-                    print(f"{msg['role'].capitalize()}: {msg['content'][:100]}...")
-                print("------------------------------------")
+        if self._debug_enabled():
+            system_content = self.messages[0]["content"]
+            if isinstance(system_content, list):
+                system_content = system_content[0]["text"]
+            self._debug("Initial system prompt:\n%s", system_content)
+            for msg in islice(self.messages, 1, None):
+                self._debug(
+                    "Initial context %s: %s...",
+                    msg["role"].capitalize(),
+                    msg["content"][:100],
+                )
+
+    def _debug_enabled(self) -> bool:
+        """Return whether debug output is wanted, through logging or verbose."""
+        return self.verbose or logger.isEnabledFor(logging.DEBUG)
+
+    def _debug(self, msg: str, *args) -> None:
+        """Log a debug message; verbose agents also get it on stderr."""
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(msg, *args, stacklevel=2)
+        elif self.verbose:
+            _VERBOSE_HANDLER.handle(
+                logger.makeRecord(
+                    logger.name, logging.DEBUG, __file__, 0, msg, args, None
+                )
+            )
+
+    def _index_tools(self):
+        """Precompute tool lookup tables and the tag patterns used while streaming."""
+        self._tools_by_name: Dict[str, Tool] = {t.name: t for t in self.tools}
+        # Images go to vision tools when present, otherwise straight to the model
+        self._has_vision_tool = any(isinstance(t, VisionBaseTool) for t in self.tools)
+        self._tool_call_patterns = {
+            t.name: re.compile(
+                rf"<{re.escape(t.name)}>(.*?)</{re.escape(t.name)}>", re.DOTALL
+            )
+            for t in self.tools
+        }
+        # Flat <param>value</param> children of each tool, for _parse_flat_params
+        self._param_patterns = {
+            t.name: re.compile(
+                r"<("
+                + "|".join(re.escape(p) for p in t.parameters)
+                + r")>([^<&]*)</\1>"
+            )
+            for t in self.tools
+            if t.parameters
+        }
+        # A single alternation over every tool name reports opening ("") and
+        # closing ("/") tool tags in one left-to-right pass.
+        self._tool_tag_pattern = (
+            re.compile(
+                r"<(/?)(" + "|".join(re.escape(t.name) for t in self.tools) + r")>"
+            )
+            if self.tools
+            else None
+        )
+        self._tool_stream_tags = {
+            t.name: f"<{t.param_stream}>" for t in self.tools if t.stream
+        }
+        # Length of the longest tag that may span chunks (closing tool tags and
+        # stream parameter tags), used to bound incremental scans
+        self._max_tag_len = max(
+            [len(t.name) + 3 for t in self.tools]
+            + [len(tag) for tag in self._tool_stream_tags.values()],
+            default=3,
+        )
 
     def _add_system_prompt(self):
-        full_prompt = build_system_prompt(
+        # Agents sharing a tool set and prompt config share one prompt string
+        full_prompt = _cached_system_prompt(
+            tuple(_tool_prompt_key(t) for t in self.tools),
             description=self._custom_description,
             add_tool_instructions=self.add_tool_instrutions,
-            tools=self.tools,
-            custom_rules=self._custom_rules,
+            custom_rules=_freeze(self._custom_rules),
             add_default_rules=self.add_default_rules,
-            custom_objective=self._custom_objective,
+            custom_objective=_freeze(self._custom_objective),
             add_default_objective=self.add_default_objective,
-            additional_context=self._additional_context,
-            custom_instructions=self._custom_instructions,
+            additional_context=_freeze(self._additional_context),
+            custom_instructions=_freeze(self._custom_instructions),
             add_think_instructions=self.add_think_instructions,
             add_final_output_instructions=self.add_final_output_instructions,
         )
-        return {
+        system_message = {
             "role": "system",
             "content": full_prompt,
         }
+        if self.use_prompt_cache:
+            return _with_cache_control(system_message)
+        return system_message
 
     def _parse_tool_call(
         self, message: str
@@ -133,7 +496,7 @@ class Agent:
         tool = None  # Keep tool variable for later use
 
         for t in self.tools:
-            m = re.search(rf"<{t.name}>(.*?)</{t.name}>", message, re.DOTALL)
+            m = self._tool_call_patterns[t.name].search(message)
             if m:
                 raw_tool_call_xml = m.group(0)
                 tool_call_content = m.group(1).strip()
@@ -145,6 +508,20 @@ class Agent:
             # No tool call found matching a known tool name
             return None, None, None, None
 
+        return self._parse_tool_call_xml(tool, raw_tool_call_xml, tool_call_content)
+
+    def _parse_tool_call_xml(
+        self, tool: Tool, raw_tool_call_xml: str, tool_call_content: str
+    ) -> tuple[Optional[str], Optional[Dict[str, str]], Optional[str], Optional[str]]:
+        """Parse an already located tool call block into its parameters.
+
+        Returns the same tuple shape as _parse_tool_call.
+        """
+        tool_name = tool.name
+        params = self._parse_flat_params(tool_name, tool_call_content)
+        if params is not None:
+            return self._validate_tool_call(tool, params, raw_tool_call_xml)
+
         try:
             # Parse the extracted content using ElementTree
             root = ET.fromstring(raw_tool_call_xml)
@@ -154,26 +531,10 @@ class Agent:
             for child in root:
                 params[child.tag] = child.text.strip() if child.text else ""
 
-            # Validate required parameters
-            missing_required = []
             # Use the 'tool' variable found in the loop
-            for p_name, p_details in tool.parameters.items():
-                if p_details.get("required", False) and p_name not in params:
-                    missing_required.append(p_name)
-            if missing_required:
-                return (
-                    None,
-                    None,
-                    f"Missing required parameters for {tool_name}: {', '.join(missing_required)}",
-                    raw_tool_call_xml,
-                )
-
-            # Parameter type validation could be added here if needed
-
-            return tool_name, params, None, raw_tool_call_xml
+            return self._validate_tool_call(tool, params, raw_tool_call_xml)
 
         except ET.ParseError as e:
-            print(f"DEBUG _parse_tool_call: XML parse error: {e}")
             return (
                 None,
                 None,
@@ -181,7 +542,6 @@ class Agent:
                 raw_tool_call_xml,
             )
         except Exception as e:
-            print(f"DEBUG _parse_tool_call: Unexpected error during parsing: {e}")
             return (
                 None,
                 None,
@@ -189,6 +549,67 @@ class Agent:
                 raw_tool_call_xml,
             )
 
+    def _parse_flat_params(
+        self, tool_name: str, content: str
+    ) -> Optional[Dict[str, str]]:
+        """Parse tool call content made only of flat, declared parameter tags.
+
+        Returns None when the content holds anything else (unknown or nested
+        tags, entities, stray text) so the caller falls back to ElementTree.
+        """
+        params = {}
+        pos = 0
+        pattern = self._param_patterns.get(tool_name)
+        if pattern:
+            for m in pattern.finditer(content):
+                if content[pos : m.start()].strip():
+                    return None
+                params[m.group(1)] = m.group(2).strip()
+                pos = m.end()
+        if content[pos:].strip():
+            return None
+        return params
+
+    def _resolve_tool_call(
+        self, scan: ToolCallScan
+    ) -> tuple[Optional[str], Optional[Dict[str, str]], Optional[str], Optional[str]]:
+        """Turn a tool-call block found by the stream scanner into a parsed call.
+
+        Uses the parameters parsed while streaming when available, then parses
+        the block the scanner found, and only searches the whole response with
+        _parse_tool_call as a last resort. Returns the same tuple shape.
+        """
+        tool = self._tools_by_name[scan.tool_name]
+        if scan.params is not None:
+            return self._validate_tool_call(tool, scan.params, scan.raw_xml)
+        # The scanner already located the block; skip searching for it again
+        open_tag, close_tag = f"<{tool.name}>", f"</{tool.name}>"
+        if scan.raw_xml.startswith(open_tag) and scan.raw_xml.endswith(close_tag):
+            content = scan.raw_xml[len(open_tag) : -len(close_tag)].strip()
+            return self._parse_tool_call_xml(tool, scan.raw_xml, content)
+        return self._parse_tool_call(scan.block)
+
+    def _validate_tool_call(
+        self, tool: Tool, params: Dict[str, str], raw_tool_call_xml: str
+    ) -> tuple[Optional[str], Optional[Dict[str, str]], Optional[str], Optional[str]]:
+        """Check the parsed parameters of a tool call against the tool definition.
+
+        Returns the same tuple shape as _parse_tool_call.
+        """
+        # Validate required parameters
+        missing_required = [p for p in tool.required_params if p not in params]
+        if missing_required:
+            return (
+                None,
+                None,
+                f"Missing required parameters for {tool.name}: {', '.join(missing_required)}",
+                raw_tool_call_xml,
+            )
+
+        # Parameter type validation could be added here if needed
+
+        return tool.name, params, None, raw_tool_call_xml
+
     async def _execute_tool(
         self, tool_name: str, params: Dict[str, str]
     ) -> tuple[str, bool]:
@@ -201,6 +622,22 @@ class Agent:
                 - result: The tool execution result or error message
                 - success: True if execution was successful, False if there were errors
         """
+        if self._prefetch is not None:
+            prefetched_name, prefetched_params, task = self._prefetch
+            self._prefetch = None
+            if prefetched_name == tool_name and prefetched_params == params:
+                return await task
+            task.cancel()
+
+        return await self._run_tool(tool_name, params)
+
+    async def _run_tool(
+        self, tool_name: str, params: Dict[str, str]
+    ) -> tuple[str, bool]:
+        """Run a tool without consulting the prefetched result.
+
+        Successful results of cacheable tools are stored and reused.
+        """
         tool = self._get_tool_by_name(tool_name)
         if not tool:
             return f"Unknown tool: {tool_name}", False
@@ -210,8 +647,20 @@ class Agent:
         except Exception as e:
             return str(e), False
 
+        cache_key = None
+        if tool.cacheable:
+            cache_key = (tool_name, tuple(sorted(params.items())))
+            cached = self._tool_cache.get(cache_key)
+            if (
+                cached is not None
+                and (tool.cache_ttl is None or time.time() - cached[1] < tool.cache_ttl)
+                and random.random() >= self.tool_cache_epsilon
+            ):
+                self._tool_cache.move_to_end(cache_key)
+                return cached[0], True
+
         try:
-            if inspect.iscoroutinefunction(tool.execute):
+            if tool.is_async:
                 if isinstance(tool, OpenAIVisionTool):
                     result = await tool.execute(
                         client=self.client, model=self.model, **params
@@ -224,60 +673,158 @@ class Agent:
             if not isinstance(result, str):
                 result = str(result)
 
+            if cache_key is not None:
+                self._tool_cache[cache_key] = (result, time.time())
+                self._tool_cache.move_to_end(cache_key)
+                while len(self._tool_cache) > self.tool_cache_size:
+                    self._tool_cache.popitem(last=False)
             return result, True
         except Exception as e:
             return f"Tool error: {str(e)}", False
 
-    @property
-    def total_token_count(self) -> int:
-        """Calculate the total number of words in the content of all messages."""
-        only_text_token_count = sum(
-            len(message["content"].split())
-            for message in self.messages
-            if isinstance(message["content"], str)
+    def invalidate_tool_cache(self, tool_name: Optional[str] = None) -> None:
+        """Drop cached tool results, for one tool or for all tools."""
+        if tool_name is None:
+            self._tool_cache.clear()
+        else:
+            for key in [k for k in self._tool_cache if k[0] == tool_name]:
+                del self._tool_cache[key]
+
+    def _start_prefetch(self, scanner: StreamScanner) -> None:
+        """Start a prefetch tool as soon as its required parameters have streamed.
+
+        _execute_tool awaits the task if the finished call has the same
+        parameters and cancels it otherwise.
+        """
+        tool = self._tools_by_name.get(scanner.tool_name)
+        if tool is None or not tool.prefetch:
+            return
+        params = scanner.partial_params()
+        if params is None or not all(p in params for p in tool.required_params):
+            return
+        params = dict(params)
+        self._prefetch = (
+            tool.name,
+            params,
+            asyncio.create_task(self._run_tool(tool.name, params)),
         )
 
-        messages_with_attachment = [
-            msg for msg in self.messages if isinstance(msg["content"], list)
-        ]
-        messages_with_attachment_token_count = 0
-        for msg in messages_with_attachment:
+    def _discard_prefetch(self) -> None:
+        """Cancel a prefetched tool run that was never claimed."""
+        if self._prefetch is not None:
+            self._prefetch[2].cancel()
+            self._prefetch = None
 
-            for content in msg["content"]:
+    @property
+    def total_token_count(self) -> int:
+        """Return the total number of tokens in the content of all messages.
 
-                if content["type"] == "text":
-                    messages_with_attachment_token_count += len(content["text"].split())
-                elif content["type"] == "image_url":
-                    messages_with_attachment_token_count += len(
-                        content["image_url"]["url"].split()
-                    )
+        Tokens are counted with tiktoken when it is installed and words otherwise.
+
+        The count is maintained incrementally by _append_message and
+        _truncate_context_window instead of being recomputed on every access.
+        """
+        return self._token_count
 
-        return only_text_token_count + messages_with_attachment_token_count
+    def _append_message(self, message: Dict) -> None:
+        """Append a message to the history and update the running token count."""
+        tokens = _count_message_tokens(message, self._encoding)
+        self.messages.append(message)
+        self._message_tokens.append(tokens)
+        self._token_count += tokens
 
     def _truncate_context_window(self):
+        # Trim old tool responses first, they are usually the bulk of the context
+        if self._token_count > self.token_limit:
+            self._trim_tool_responses()
         # Only pop messages (except system and last) until under token limit.
-        while self.total_token_count > self.token_limit and len(self.messages) > 2:
-            if self.verbose:
-                print(
-                    f"==={self.total_token_count} > {self.token_limit}, removing oldest message (except system and last)==="
-                )
+        if self._token_count > self.token_limit and len(self.messages) > 2:
             # Always preserve the first (system) and last message
-            del self.messages[1]
-        if self.verbose:
-            print(f"===CONTEXT WINDOW TOKEN COUNT: {self.total_token_count}===")
+            system_message = self.messages.popleft()
+            system_tokens = self._message_tokens.popleft()
+            while self._token_count > self.token_limit and len(self.messages) > 1:
+                self._debug(
+                    "%d > %d, removing oldest message (except system and last)",
+                    self._token_count,
+                    self.token_limit,
+                )
+                self.messages.popleft()
+                self._token_count -= self._message_tokens.popleft()
+            self.messages.appendleft(system_message)
+            self._message_tokens.appendleft(system_tokens)
+        self._debug("Context window token count: %d", self._token_count)
+
+    def _trim_tool_responses(self) -> None:
+        """Shorten old tool responses, oldest first, until under the token limit."""
+        # Skip the system message and keep the last message intact
+        for i in range(1, len(self.messages) - 1):
+            if self._token_count <= self.token_limit:
+                return
+            message = self.messages[i]
+            if not isinstance(message["content"], str):
+                continue
+            trimmed = _trim_tool_response(message["content"], self.tool_response_keep)
+            if trimmed is None:
+                continue
+            message = {**message, "content": trimmed}
+            tokens = _count_message_tokens(message, self._encoding)
+            self._token_count += tokens - self._message_tokens[i]
+            self.messages[i] = message
+            self._message_tokens[i] = tokens
+
+    async def _create_completion(self):
+        """Open the streamed completion for the current messages.
+
+        Only opening the request is bounded by the concurrency limit; reading
+        the stream happens outside it so slow readers do not block new requests.
+        """
+        async with self._concurrency_semaphore() or contextlib.nullcontext():
+            return await self.client.chat.completions.create(
+                messages=list(self.messages), stream=True, **self._completion_options()
+            )
+
+    def _concurrency_semaphore(self) -> Optional[asyncio.Semaphore]:
+        """Return the semaphore bounding this agent's requests, if any."""
+        if isinstance(self._concurrency, int):
+            return _loop_semaphore(self._semaphores, self._concurrency)
+        return self._concurrency or _default_concurrency()
 
-    def _split_tokens(self, content: str) -> List[str]:
-        """Split LLM delta content into elementary tokens for streaming."""
-        return re.findall(r"(<|>|\s+|[^\s<>]+)", content)
+    def _completion_options(self) -> Dict:
+        """Return the model options shared by streamed and batched requests."""
+        options = {"model": self.model}
+        if self.model.startswith("gpt-5"):
+            options["reasoning_effort"] = "minimal"
+        return options
+
+    def _response_cache_key(self) -> str:
+        """Hash the endpoint, model options and conversation of a completion."""
+        request = json.dumps(
+            {
+                "base_url": self.base_url,
+                "options": self._completion_options(),
+                "messages": list(self.messages),
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.blake2b(request.encode(), digest_size=32).hexdigest()
+
+    def _cache_response(self, cache_key: Optional[str], scanner: StreamScanner) -> None:
+        """Store the streamed response when the response cache is enabled."""
+        if cache_key is not None:
+            self.response_cache[cache_key] = scanner.text()
+
+    async def _replay(self, text: str) -> AsyncGenerator[str, None]:
+        """Yield a cached response as a single streamed chunk."""
+        if text:
+            yield text
 
     async def _token_stream(self, response) -> AsyncGenerator[str, None]:
-        """Flatten the LLM streaming response into a stream of tokens."""
+        """Yield the non-empty text deltas of the LLM streaming response."""
         async for chunk in response:
             text = chunk.choices[0].delta.content
-            if not text:
-                continue
-            for token in self._split_tokens(text):
-                yield token
+            if text:
+                yield text
 
     async def run_stream(
         self, user_input: str, image_urls: Optional[List[str]] = None
@@ -298,151 +845,179 @@ class Agent:
         the main loop to get user input and then continue the conversation with that input.
         """
 
-        if image_urls and not any(
-            [isinstance(tool, VisionBaseTool) for tool in self.tools]
-        ):
-            print("=== Appending image to messages ===")
-            image_dicts = [
-                {"type": "image_url", "image_url": {"url": url}} for url in image_urls
-            ]
-            self.messages.append(
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": user_input},
-                        *image_dicts,
-                    ],
-                }
-            )
+        if image_urls and not self._has_vision_tool:
+            self._debug("Appending image to messages")
+            self._append_message(_build_image_message(user_input, image_urls))
         else:
-            self.messages.append({"role": "user", "content": user_input})
+            self._append_message({"role": "user", "content": user_input})
 
         # first message input is not handled by Runner
         self._truncate_context_window()
-        if self.model.startswith("gpt-5"):
-            response = await self.client.chat.completions.create(
-                model=self.model, messages=self.messages, stream=True,reasoning_effort="minimal"
-            )
+        cache_key = cached = None
+        if self.response_cache is not None:
+            cache_key = self._response_cache_key()
+            cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            self._debug("Response cache hit")
+            cache_key = None
+            stream = self._replay(cached)
         else:
-            response = await self.client.chat.completions.create(
-                model=self.model, messages=self.messages, stream=True
-            )
-
-        full_response = ""
-        tool_name = None
-        params = None
-        error_message = None
-        raw_tool_xml = None
-        halted = False
-        tag_found = False
-        tool_found = False
-        tokens_since_halted = 0
-        halted_tokens = ""
-
-        ## New experimental feature: streaming tool responses
-        tool_streaming = False
-        stream_param = None
-
-        async for content in self._token_stream(response):
-            full_response += content
-            if "<" in content:
-                halted = True
-
-            # Normal response when not halted
-            if not halted:
-                yield TextResponseEvent.from_text(content)
-                continue
-
-            # Accumulate after halt
-            tokens_since_halted += 1
-            halted_tokens += content
+            stream = self._token_stream(await self._create_completion())
 
-            # Flush buffer if no tag detected within 5 tokens
-            if tokens_since_halted > 5 and not tag_found:
-                yield TextResponseEvent.from_text(halted_tokens)
-                halted = False
-                tokens_since_halted = 0
-                halted_tokens = ""
-                continue
+        self._discard_prefetch()
+        scanner = StreamScanner(
+            self._tool_tag_pattern, self._tool_stream_tags, self._max_tag_len
+        )
 
-            # Detect start of tool tag
-            if not tag_found:
-                for t in self.tools:
-                    if f"<{t.name}>" in full_response:
-                        tag_found = True
-                        if t.stream:
-                            tool_streaming = True
-                            stream_param = t.param_stream
-                        break
-
-            # Handle complete tags
-            if tag_found:
-                check_set = {"<", ">", "/"}
-                if tool_streaming:
-                    if f"<{stream_param}>" in full_response and not check_set & {
-                        content.strip()
-                    }:
-                        yield TextResponseEvent.from_text(content)
-                    if "</" in full_response:
-                        tool_streaming = False
-                # print("----- Tag found -----")
-                # print("Starting to parse tool call")
-                if not tool_found:
-                    for t in self.tools:
-                        # print(f"Checking for </{t.name}>")
-                        # print(f"Full response at this point: {full_response}")
-                        if f"</{t.name}>" in full_response:
-                            tag_found = False
-                            tool_name, params, error_message, raw_tool_xml = (
-                                self._parse_tool_call(full_response)
-                            )
-                            break
-                    if error_message:
-                        yield ToolErrorEvent.from_error(
-                            error_message, raw_tool_xml, tool_name
+        async for content in stream:
+            events = scanner.feed(content)
+            if scanner.in_tool and self._prefetch is None:
+                self._start_prefetch(scanner)
+            for kind, payload in events:
+                if kind == TEXT:
+                    yield TextResponseEvent.from_text(payload)
+                    continue
+
+                tool_name, params, error_message, raw_tool_xml = (
+                    self._resolve_tool_call(payload)
+                )
+                if error_message:
+                    self._discard_prefetch()
+                    self._cache_response(cache_key, scanner)
+                    yield ToolErrorEvent.from_error(
+                        error_message, raw_tool_xml, tool_name
+                    )
+                    return
+                if raw_tool_xml:
+                    self._cache_response(cache_key, scanner)
+                    if tool_name and params:
+                        yield ToolCallResponseEvent.from_xml(
+                            tool_name, params, raw_tool_xml
                         )
-                        return
-                    if raw_tool_xml:
-                        tool_found = True
-                        if tool_name and params:
-                            yield ToolCallResponseEvent.from_xml(
-                                tool_name, params, raw_tool_xml
-                            )
-                        else:
-                            # Fallback to old format if parsing failed or the tool does not require any parameters
-                            yield ToolCallResponseEvent(
-                                type="tool_call",
-                                content=raw_tool_xml or "",
-                                tool_name=tool_name if tool_name else "",
-                                parameters={},  # Empty parameters
-                                raw_content=raw_tool_xml or "",
-                            )
-                        return
-
-                # Removed thinking block handling - will be handled as a normal tool call
+                    else:
+                        # Fallback to old format if parsing failed or the tool does not require any parameters
+                        yield ToolCallResponseEvent(
+                            type=EventType.TOOL_CALL,
+                            content=raw_tool_xml or "",
+                            tool_name=tool_name if tool_name else "",
+                            parameters={},  # Empty parameters
+                            raw_content=raw_tool_xml or "",
+                        )
+                    return
 
         # --- After the stream loop finishes ---
-        print(f"Stream finished. Final accumulated content: {full_response}")
-        self.messages.append({"role": "assistant", "content": full_response})
+        # No tool call completed, so a prefetched run can never be claimed
+        self._discard_prefetch()
+        for _, text in scanner.flush():
+            yield TextResponseEvent.from_text(text)
+        full_response = scanner.text()
+        halted_tokens = scanner.pending()
+        if self._debug_enabled():
+            # Handlers may write synchronously; keep large responses off the loop
+            await asyncio.get_running_loop().run_in_executor(
+                None,
+                self._debug,
+                "Stream finished. Final accumulated content: %s",
+                full_response,
+            )
+        self._append_message({"role": "assistant", "content": full_response})
+        self._cache_response(cache_key, scanner)
 
-        if tag_found and not tool_found:
-            print("Stream ended with an unclosed tool call.")
+        if scanner.in_tool:
+            self._debug("Stream ended with an unclosed tool call.")
             yield ToolErrorEvent.from_error(
                 "Stream ended unexpectedly within a tool call. Closing tag not found.",
                 halted_tokens,
             )
-        elif halted and not tool_found and not tag_found:
+        elif scanner.halted:
             # If we halted (saw '<') but never found a complete tag or ended inside one, yield the buffered content as response
-            print("----- Stream ended after halting, flushing remaining buffer -----")
-            print(halted_tokens)
-            print("-------------------------------------------------------")
+            if self._debug_enabled():
+                self._debug(
+                    "Stream ended after halting, flushing remaining buffer: %s",
+                    halted_tokens,
+                )
             yield TextResponseEvent.from_text(halted_tokens)
 
         # Agent no longer appends assistant responses to its own history
 
+    async def run_batch(
+        self, user_inputs: List[str], poll_interval: float = 30.0
+    ) -> List[Optional[str]]:
+        """Answer independent user inputs through the OpenAI Batch API.
+
+        Each input is sent as a single turn on top of the current conversation,
+        which is left unchanged. Batches are cheaper but may take up to 24 hours,
+        so this suits offline evaluations rather than interactive use. Tool calls
+        are not executed: the raw assistant reply is returned for each input, or
+        None if that request failed.
+        """
+        history = list(self.messages)
+        options = self._completion_options()
+        lines = [
+            json.dumps(
+                {
+                    "custom_id": str(i),
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        **options,
+                        "messages": history + [{"role": "user", "content": user_input}],
+                    },
+                }
+            )
+            for i, user_input in enumerate(user_inputs)
+        ]
+        batch_file = await self.client.files.create(
+            file=("batch.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch"
+        )
+        batch = await self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(poll_interval)
+            batch = await self.client.batches.retrieve(batch.id)
+        if batch.status != "completed":
+            raise RuntimeError(f"Batch {batch.id} ended with status {batch.status}")
+
+        results: List[Optional[str]] = [None] * len(user_inputs)
+        if batch.output_file_id:
+            output = await self.client.files.content(batch.output_file_id)
+            for line in output.text.splitlines():
+                if not line:
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                if response.get("status_code") == 200:
+                    message = response["body"]["choices"][0]["message"]
+                    results[int(record["custom_id"])] = message.get("content")
+        return results
+
     def _get_tool_by_name(self, tool_name: str) -> Optional[Tool]:
         """Return the tool with the given name from self.tools, or None if not found."""
-        for tool in self.tools:
-            if tool.name == tool_name:
-                return tool
-        return None
+        return self._tools_by_name.get(tool_name)
+
+    def add_tool(self, tool: Tool) -> None:
+        """Register a tool, replacing any tool with the same name."""
+        self.tools = [t for t in self.tools if t.name != tool.name] + [tool]
+        # Results of a replaced tool must not be served for the new one
+        self.invalidate_tool_cache(tool.name)
+        self._refresh_tools()
+
+    def remove_tool(self, tool_name: str) -> None:
+        """Unregister the tool with the given name, if present."""
+        self.tools = [t for t in self.tools if t.name != tool_name]
+        self.invalidate_tool_cache(tool_name)
+        self._refresh_tools()
+
+    def _refresh_tools(self) -> None:
+        """Rebuild the tool lookup tables and the system prompt after a change."""
+        # A prefetched run may belong to a tool that was just replaced or removed
+        self._discard_prefetch()
+        self._index_tools()
+        self._system_message = self._add_system_prompt()
+        tokens = _count_message_tokens(self._system_message, self._encoding)
+        self._token_count += tokens - self._message_tokens[0]
+        self.messages[0] = self._system_message
+        self._message_tokens[0] = tokens
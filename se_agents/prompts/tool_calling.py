@@ -1,16 +1,3 @@
-tools_placeholder = """{% for tool in tools %}
-## {{ tool.name }}
-{{ tool.description }}
-Parameters:
-{% for name, param in tool.parameters.items() %}
-- {{ name }}: {{ param.description }} {% if param.required %}(required){% endif %}
-{% endfor %}
-Usage:
-<{{ tool.name }}>
-{% for name, param in tool.parameters.items() %}<{{ name }}>{{ name }} here</{{ name }}>
-{% endfor %}</{{ tool.name }}>
-{% endfor %}"""
-
 prompt = f"""TOOL USE
 
 You have access to a set of tools that are executed upon the user's approval. You can use one tool per message, and will receive the result of that tool use in the user's response. You use tools step-by-step to accomplish a given task, with each tool use informed by the result of the previous tool use.
@@ -39,7 +26,7 @@ To search the web:
 
 # Available Tools
 
-{tools_placeholder}
+{{tools}}
 
 # Tool Use Guidelines
 
@@ -1,7 +1,25 @@
-from typing import AsyncGenerator, List, Optional, Union, Tuple
+import asyncio
+import logging
+from typing import Any, AsyncGenerator, Coroutine, List, Optional, TypeVar, Union, Tuple
 
 from se_agents.agent import Agent
-from se_agents.schemas import ResponseEvent, ToolCallResponseEvent, TextResponseEvent, ToolResponseEvent, ToolErrorEvent
+from se_agents.schemas import EventType, ResponseEvent, ToolCallResponseEvent, TextResponseEvent, ToolResponseEvent, ToolErrorEvent
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def run_with_uvloop(main: Coroutine[Any, Any, T]) -> T:
+    """Run a coroutine on uvloop's faster event loop, in place of asyncio.run().
+
+    Requires the optional uvloop package (not available on Windows). The global
+    event loop policy is left untouched.
+    """
+    import uvloop
+
+    with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+        return runner.run(main)
 
 
 class Runner:
@@ -46,86 +64,68 @@ class Runner:
         while True:
             tool_event = False
             final_output = False
-            buffered_response = ""
             final_output_result_content = None
 
             async for event in self.agent.run_stream(next_input, image_urls):
-                # Handle specialized ToolCallResponseEvent
-                if isinstance(event, ToolCallResponseEvent):
-                    tool_event = True
-                    yield event
-                    
-                    # Process the tool call
-                    response_event, is_final, final_content = await self._execute_tool_and_create_response(
-                        event.tool_name, event.parameters
-                    )
-                    
-                    yield response_event
-                    next_input = response_event.content
-                    
-                    if is_final:
-                        final_output = True
-                        final_output_result_content = final_content
-                    
-                    break
-                
-                # Handle legacy tool_call event
-                elif event.type == "tool_call":
-                    tool_event = True
-                    yield event
-                    
-                    # Parse the tool call from XML
-                    tool_name, params, error_msg, raw_xml = self.agent._parse_tool_call(
-                        event.content
-                    )
-                    
-                    if error_msg or not tool_name:
-                        # Handle parsing error
-                        error_event = ToolErrorEvent.from_error(
-                            f"Runner failed to parse tool call: {error_msg or 'Parse failure'}", 
-                            raw_xml
+                match event.type:
+                    # Handle tool calls, parsing the XML of legacy tool_call events
+                    case EventType.TOOL_CALL:
+                        tool_event = True
+                        yield event
+                        
+                        if isinstance(event, ToolCallResponseEvent):
+                            tool_name, params = event.tool_name, event.parameters
+                        else:
+                            tool_name, params, error_msg, raw_xml = self.agent._parse_tool_call(
+                                event.content
+                            )
+                            
+                            if error_msg or not tool_name:
+                                # Handle parsing error
+                                error_event = ToolErrorEvent.from_error(
+                                    f"Runner failed to parse tool call: {error_msg or 'Parse failure'}", 
+                                    raw_xml
+                                )
+                                yield error_event
+                                next_input = error_event.content
+                                break
+                        
+                        # Process the tool call
+                        response_event, is_final, final_content = await self._execute_tool_and_create_response(
+                            tool_name, params
                         )
-                        yield error_event
-                        next_input = error_event.content
+                        
+                        yield response_event
+                        next_input = response_event.content
+                        
+                        if is_final:
+                            final_output = True
+                            final_output_result_content = final_content
+                        
                         break
                     
-                    # Process the tool call
-                    response_event, is_final, final_content = await self._execute_tool_and_create_response(
-                        tool_name, params
-                    )
-                    
-                    yield response_event
-                    next_input = response_event.content
-                    
-                    if is_final:
-                        final_output = True
-                        final_output_result_content = final_content
-                    
-                    break
-                
-                # Handle tool_error events
-                elif event.type == "tool_error":
-                    tool_event = True
-                    if isinstance(event, ToolErrorEvent):
-                        yield event
-                    else:
-                        # Convert legacy error event to specialized class
-                        error_event = ToolErrorEvent.from_error("Tool error", event.content)
-                        yield error_event
-                    next_input = event.content
-                    break
-                
-                # Handle text response events
-                elif event.type == "response":
-                    if self.enforce_final:
-                        buffered_response += event.content
-                    else:
-                        if isinstance(event, TextResponseEvent):
+                    # Handle tool_error events
+                    case EventType.TOOL_ERROR:
+                        tool_event = True
+                        if isinstance(event, ToolErrorEvent):
                             yield event
                         else:
-                            # Convert legacy response event to specialized class
-                            yield TextResponseEvent.from_text(event.content)
-            
+                            # Convert legacy error event to specialized class
+                            error_event = ToolErrorEvent.from_error("Tool error", event.content)
+                            yield error_event
+                        next_input = event.content
+                        break
+                    
+                    # Handle text response events
+                    case EventType.RESPONSE:
+                        # With enforce_final only the final_output result is shown
+                        if not self.enforce_final:
+                            if isinstance(event, TextResponseEvent):
+                                yield event
+                            else:
+                                # Convert legacy response event to specialized class
+                                yield TextResponseEvent.from_text(event.content)
+                
             # Handle enforce_final logic
             if self.enforce_final:
                 if final_output:
@@ -135,7 +135,7 @@ class Runner:
                 elif tool_event:
                     continue
                 else:
-                    print("No final output found, retrying with feedback")
+                    logger.info("No final output found, retrying with feedback")
                     reprompt_message = "You did not conclude the task using the 'final_output' tool. Please provide the final result using the 'final_output' tool now."
                     next_input = f"<feedback>\n{reprompt_message}\n</feedback>\n"
                     continue
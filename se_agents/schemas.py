@@ -1,22 +1,45 @@
-from typing import Literal, Dict, Optional
+from dataclasses import asdict, dataclass
+from enum import StrEnum
+from typing import Dict, Optional
 
-from pydantic import BaseModel
+# Wrappers of the tool results sent back to the model
+TOOL_RESPONSE_PREFIX = "<tool_response>\n"
+TOOL_RESPONSE_SUFFIX = "\n</tool_response>\n"
+TOOL_ERROR_PREFIX = "<tool_error>\n"
+TOOL_ERROR_SUFFIX = "\n</tool_error>\n"
 
 
-class ResponseEvent(BaseModel):
-    type: Literal["response", "tool_call", "tool_response", "tool_error"]
+class EventType(StrEnum):
+    """Kinds of events; members compare equal to their plain string values."""
+    RESPONSE = "response"
+    TOOL_CALL = "tool_call"
+    TOOL_RESPONSE = "tool_response"
+    TOOL_ERROR = "tool_error"
+
+
+# Events are created for every streamed chunk, so they are plain slotted
+# dataclasses rather than validated models
+@dataclass(slots=True)
+class ResponseEvent:
+    type: EventType
     content: str
 
+    def model_dump(self) -> Dict:
+        """Return the event fields as a dict, as the former pydantic models did."""
+        return asdict(self)
+
 
+@dataclass(slots=True)
 class TextResponseEvent(ResponseEvent):
     """Event for regular text responses from the agent."""
     
     @classmethod
     def from_text(cls, content: str):
         """Create a TextResponseEvent from a text string"""
-        return cls(type="response", content=content)
+        return cls(type=EventType.RESPONSE, content=content)
 
 
+@dataclass(slots=True)
 class ToolCallResponseEvent(ResponseEvent):
     """Event for tool calls made by the agent."""
     tool_name: str
@@ -27,7 +50,7 @@ class ToolCallResponseEvent(ResponseEvent):
     def from_xml(cls, tool_name: str, parameters: Dict, raw_xml: str):
         """Create a ToolCallResponseEvent from parsed XML data"""
         return cls(
-            type="tool_call",
+            type=EventType.TOOL_CALL,
             content=raw_xml,  # Keep the original content for backward compatibility
             tool_name=tool_name,
             parameters=parameters,
@@ -35,6 +58,7 @@ class ToolCallResponseEvent(ResponseEvent):
         )
 
 
+@dataclass(slots=True)
 class ToolResponseEvent(ResponseEvent):
     """Event for tool execution responses."""
     result: str
@@ -43,15 +67,16 @@ class ToolResponseEvent(ResponseEvent):
     @classmethod
     def from_execution(cls, result: str, tool_name: Optional[str] = None):
         """Create a ToolResponseEvent from a tool execution result"""
-        content = f"<tool_response>\n{result}\n</tool_response>\n"
+        content = TOOL_RESPONSE_PREFIX + result + TOOL_RESPONSE_SUFFIX
         return cls(
-            type="tool_response",
+            type=EventType.TOOL_RESPONSE,
             content=content,  # Keep the formatted content for backward compatibility
             result=result,
             tool_name=tool_name
         )
 
 
+@dataclass(slots=True)
 class ToolErrorEvent(ResponseEvent):
     """Event for tool execution errors."""
     error_message: str
@@ -61,13 +86,13 @@ class ToolErrorEvent(ResponseEvent):
     @classmethod
     def from_error(cls, error_message: str, raw_xml: Optional[str] = None, tool_name: Optional[str] = None):
         """Create a ToolErrorEvent from an error message"""
-        content = f"<tool_error>\n{error_message}"
         if raw_xml:
-            content += f"\nRaw XML:\n{raw_xml}"
-        content += "\n</tool_error>\n"
+            content = f"{TOOL_ERROR_PREFIX}{error_message}\nRaw XML:\n{raw_xml}{TOOL_ERROR_SUFFIX}"
+        else:
+            content = TOOL_ERROR_PREFIX + error_message + TOOL_ERROR_SUFFIX
         
         return cls(
-            type="tool_error",
+            type=EventType.TOOL_ERROR,
             content=content,  # Keep the formatted content for backward compatibility
             error_message=error_message,
             raw_xml=raw_xml,
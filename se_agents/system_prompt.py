@@ -1,3 +1,5 @@
+import functools
+
 from se_agents.prompts.additional_context import prompt as additional_context_prompt
 from se_agents.prompts.custom_instructions import prompt as custom_instructions_template
 from se_agents.prompts.description import prompt as description_prompt
@@ -26,26 +28,41 @@ def insert_custom_instructions(section_prompt, custom_instructions):
         return section_prompt
 
 
+@functools.lru_cache(maxsize=256)
+def _format_tool_block(name, description, parameters):
+    """
+    Format one tool's entry of the TOOLS section.
+    `parameters` is a tuple of (name, description, required) triples.
+    """
+    lines = [f"## {name}", description, "Parameters:"]
+    for param, param_description, is_required in parameters:
+        required = "(required)" if is_required else ""
+        lines.append(f"- {param}: {param_description} {required}")
+    lines.append("Usage:")
+    lines.append(f"<{name}>")
+    for param, _, _ in parameters:
+        lines.append(f"<{param}>{param} here</{param}>")
+    lines.append(f"</{name}>\n\n")
+    return "\n".join(lines)
+
+
 def build_tools_section(tools):
     """
     Build the TOOLS section as a string from a list of Tool objects.
     """
     if not tools:
         return ""
-    tools_section = ""
-    for tool in tools:
-        tools_section += f"## {tool.name}\n"
-        tools_section += f"{tool.description}\n"
-        tools_section += "Parameters:\n"
-        for name, param in tool.parameters.items():
-            required = "(required)" if param.get("required", False) else ""
-            tools_section += f"- {name}: {param.get('description', '')} {required}\n"
-        tools_section += "Usage:\n"
-        tools_section += f"<{tool.name}>\n"
-        for name in tool.parameters:
-            tools_section += f"<{name}>{name} here</{name}>\n"
-        tools_section += f"</{tool.name}>\n\n"
-    return tools_section
+    return "".join(
+        _format_tool_block(
+            tool.name,
+            tool.description,
+            tuple(
+                (name, param.get("description", ""), param.get("required", False))
+                for name, param in tool.parameters.items()
+            ),
+        )
+        for tool in tools
+    )
 
 
 def build_system_prompt(
@@ -76,11 +93,12 @@ def build_system_prompt(
     # DESCRIPTION section
     description_section = description if description is not None else description_prompt
 
-    # TOOL USE section
-    tool_calling_section = tool_calling_prompt if add_tool_instructions else ""
-
-    # TOOLS section
-    tools_section = build_tools_section(tools) if add_tool_instructions else ""
+    # TOOL USE section, with the TOOLS section under its "Available Tools" heading
+    tool_calling_section = ""
+    if add_tool_instructions:
+        tool_calling_section = tool_calling_prompt.replace(
+            "{tools}", build_tools_section(tools).strip()
+        )
 
     # ADDITIONAL CONTEXT section
     additional_context_section = ""
@@ -133,20 +151,14 @@ def build_system_prompt(
     sections = [
         description_section,
         tool_calling_section,
-        tools_section,
         think_section,
         rules_section,
         objective_section,
         additional_context_section,
         final_output_section,
     ]
-    full_prompt = ""
-    for content in sections:
-        if content:
-            # Ensure each section is separated by a single newline
-            if not full_prompt.endswith("\n") and full_prompt:
-                full_prompt += "\n"
-            full_prompt += content.strip() + "\n\n"
+    # Each section is stripped and followed by a blank line
+    full_prompt = "".join(content.strip() + "\n\n" for content in sections if content)
 
     # Add any extra custom instructions (not rules/objective) at the end
     if custom_instructions is not None:
@@ -1,6 +1,9 @@
 import base64
+import inspect
+import logging
 import time
 from abc import abstractmethod
+from functools import cached_property
 from pathlib import Path
 from typing import List
 
@@ -11,6 +14,8 @@ from firecrawl import FirecrawlApp
 from openai import Client
 from requests import HTTPError
 
+logger = logging.getLogger(__name__)
+
 
 class Tool:
     def __init__(
@@ -20,20 +25,44 @@ class Tool:
         parameters: dict,
         stream: bool = False,
         param_stream: str = None,
+        prefetch: bool = False,
+        cacheable: bool = False,
+        cache_ttl: float = None,
     ):
         self.name = name
         self.description = description
         self.parameters = parameters
         self.stream = stream
+        # Safe to start before the call has finished streaming (idempotent,
+        # side-effect free); the result is discarded if the final call differs
+        self.prefetch = prefetch
+        # Results may be reused for identical calls, for up to cache_ttl
+        # seconds (forever when None)
+        self.cacheable = cacheable
+        self.cache_ttl = cache_ttl
 
         if stream and not param_stream:
             raise ValueError("Streaming tools must have a param_stream specified")
         self.param_stream = param_stream
 
+    @cached_property
+    def required_params(self) -> tuple:
+        """Names of the required parameters, in declaration order."""
+        return tuple(
+            name
+            for name, config in self.parameters.items()
+            if config.get("required", False)
+        )
+
+    @cached_property
+    def is_async(self) -> bool:
+        """Whether execute is a coroutine function that must be awaited."""
+        return inspect.iscoroutinefunction(self.execute)
+
     def _process_parameters(self, **kwargs: dict) -> dict:
         # Enforce required parameters
-        for name, config in self.parameters.items():
-            if config.get("required", False) and name not in kwargs:
+        for name in self.required_params:
+            if name not in kwargs:
                 raise ValueError(f"Missing required parameter: {name}")
 
         processed_parameters = {}
@@ -226,7 +255,9 @@ class ExaSearch(Tool):
                 )
 
                 if status_code == 429 or "429" in msg:
-                    print("Rate limit exceeded (429). Retrying after 1 second...")
+                    logger.warning(
+                        "Rate limit exceeded (429). Retrying after 1 second..."
+                    )
                     time.sleep(1)
                     continue
                 else:
@@ -294,7 +325,7 @@ class ExaCrawl(Tool):
                     e.response, "status_code", None
                 )
                 if status_code == 429 or "429" in msg:
-                    print(
+                    logger.warning(
                         "Rate limit exceeded (429) for crawl. Retrying after 1 second..."
                     )
                     time.sleep(1)
@@ -305,8 +336,8 @@ class ExaCrawl(Tool):
                     )
                     if retries == 0 and not status_code:
                         retries += 1
-                        print(
-                            "==== Response returned N/A, retrying without livecrawl..."
+                        logger.warning(
+                            "Response returned N/A, retrying without livecrawl..."
                         )
                         continue
 
@@ -494,7 +525,7 @@ class OpenAIVisionTool(VisionBaseTool):
             stream=False,
         )
 
-        print(f"===OpenAI returned a response with type {type(response)}")
+        logger.debug("OpenAI returned a response with type %s", type(response))
 
         return response.choices[0].message.content
 
@@ -0,0 +1,108 @@
+"""Offline stand-ins for the OpenAI streaming API used by the tests."""
+
+import asyncio
+import random
+from types import SimpleNamespace
+
+from se_agents.agent import Agent
+from se_agents.tools import Tool
+
+
+class EchoTool(Tool):
+    def __init__(self, **kwargs):
+        super().__init__(
+            name="echo",
+            description="Echo the text back",
+            parameters={
+                "text": {"type": "string", "description": "Text", "required": True},
+            },
+            **kwargs,
+        )
+        self.calls = 0
+
+    def execute(self, **kwargs):
+        self.calls += 1
+        return self._process_parameters(**kwargs)["text"]
+
+
+class SayTool(Tool):
+    def __init__(self):
+        super().__init__(
+            name="say",
+            description="Say something to the user",
+            parameters={
+                "message_to_user": {
+                    "type": "string",
+                    "description": "Message",
+                    "required": True,
+                },
+            },
+            stream=True,
+            param_stream="message_to_user",
+        )
+
+    def execute(self, **kwargs):
+        return kwargs["message_to_user"]
+
+
+class FakeStream:
+    """Async iterator over chat completion chunks with the given deltas."""
+
+    def __init__(self, deltas):
+        self._deltas = iter(deltas)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            delta = next(self._deltas)
+        except StopIteration:
+            raise StopAsyncIteration
+        return SimpleNamespace(
+            choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))]
+        )
+
+
+def make_agent(*responses, **kwargs):
+    """Build an agent whose completions stream the given chunk lists in turn.
+
+    The number of completion requests made is available as agent.requests.
+    """
+    agent = Agent(api_key="test", model="test-model", **kwargs)
+    replies = iter(responses)
+    agent.requests = 0
+
+    async def create(**_):
+        agent.requests += 1
+        return FakeStream(next(replies))
+
+    # Each agent gets its own client so the fake is not shared through the pool
+    agent.client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+    return agent
+
+
+def collect(agent, user_input="hi"):
+    """Run one turn of the agent and return its events."""
+
+    async def run():
+        return [event async for event in agent.run_stream(user_input)]
+
+    return asyncio.run(run())
+
+
+def text_of(events):
+    """Join the content of the text events."""
+    return "".join(e.content for e in events if e.type == "response")
+
+
+def split_every(text, size):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def split_randomly(text, seed):
+    rng = random.Random(seed)
+    cuts = sorted(rng.sample(range(1, len(text)), rng.randint(1, len(text) // 3)))
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
@@ -0,0 +1,78 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from _fakes import make_agent
+
+
+def fake_batch_client(replies, statuses=("in_progress", "completed")):
+    """Client whose batch answers each request with the reply for its index.
+
+    A reply of None makes that request fail.
+    """
+    uploaded = {}
+    statuses = iter(statuses)
+
+    async def create_file(file, purpose):
+        uploaded["requests"] = [json.loads(line) for line in file[1].splitlines()]
+        return SimpleNamespace(id="file-in")
+
+    def batch():
+        return SimpleNamespace(
+            id="batch-1", status=next(statuses), output_file_id="file-out"
+        )
+
+    async def create_batch(**_):
+        return batch()
+
+    async def retrieve_batch(batch_id):
+        return batch()
+
+    async def content(file_id):
+        records = []
+        # Output records are not in request order
+        for request in reversed(uploaded["requests"]):
+            reply = replies[int(request["custom_id"])]
+            body = {"choices": [{"message": {"content": reply}}]}
+            records.append(
+                {
+                    "custom_id": request["custom_id"],
+                    "response": {
+                        "status_code": 200 if reply is not None else 500,
+                        "body": body,
+                    },
+                }
+            )
+        return SimpleNamespace(text="\n".join(json.dumps(r) for r in records))
+
+    client = SimpleNamespace(
+        files=SimpleNamespace(create=create_file, content=content),
+        batches=SimpleNamespace(create=create_batch, retrieve=retrieve_batch),
+    )
+    return client, uploaded
+
+
+def test_batch_results_follow_the_input_order():
+    agent = make_agent()
+    agent.client, uploaded = fake_batch_client(["one", None, "three"])
+    history = list(agent.messages)
+
+    results = asyncio.run(agent.run_batch(["a", "b", "c"], poll_interval=0))
+
+    assert results == ["one", None, "three"]
+    assert [r["body"]["messages"][-1]["content"] for r in uploaded["requests"]] == [
+        "a",
+        "b",
+        "c",
+    ]
+    assert uploaded["requests"][0]["body"]["messages"][:-1] == history
+    assert list(agent.messages) == history
+
+
+def test_failed_batch_raises():
+    agent = make_agent()
+    agent.client, _ = fake_batch_client(["one"], statuses=("expired",))
+    with pytest.raises(RuntimeError, match="expired"):
+        asyncio.run(agent.run_batch(["a"], poll_interval=0))
@@ -0,0 +1,74 @@
+import pytest
+
+from _fakes import make_agent
+
+from se_agents.agent import _count_message_tokens, _trim_tool_response
+from se_agents.schemas import TOOL_RESPONSE_PREFIX, TOOL_RESPONSE_SUFFIX
+
+
+def test_messages_without_content_count_as_zero_tokens():
+    assert _count_message_tokens({"role": "assistant", "content": None}) == 0
+
+    agent = make_agent(initial_messages=[{"role": "assistant", "content": None}])
+    system_tokens = _count_message_tokens(agent.messages[0], agent._encoding)
+    assert agent.total_token_count == system_tokens
+
+
+def tool_response(body):
+    return TOOL_RESPONSE_PREFIX + body + TOOL_RESPONSE_SUFFIX
+
+
+def body_of(content):
+    return content[len(TOOL_RESPONSE_PREFIX) : -len(TOOL_RESPONSE_SUFFIX)]
+
+
+@pytest.mark.parametrize("keep", [0, 1, 10, 101])
+def test_trimmed_tool_response_keeps_head_and_tail(keep):
+    body = "".join(f"{i:04d}" for i in range(200))
+    trimmed = _trim_tool_response(tool_response(body), keep)
+
+    head, _, tail = body_of(trimmed).partition("\n...[truncated ")
+    tail = tail.split("]...\n", 1)[1]
+    assert len(head) + len(tail) == keep
+    assert body.startswith(head) and body.endswith(tail)
+    assert f"[truncated {len(body) - keep} characters]" in trimmed
+
+
+def test_tool_response_is_trimmed_only_once():
+    trimmed = _trim_tool_response(tool_response("x" * 1000), 10)
+    assert _trim_tool_response(trimmed, 10) is None
+    assert _trim_tool_response(trimmed, 0) is None
+
+
+def test_short_or_non_tool_content_is_not_trimmed():
+    assert _trim_tool_response(tool_response("x" * 20), 10) is None
+    assert _trim_tool_response("x" * 1000, 10) is None
+
+
+def test_old_tool_responses_are_trimmed_before_messages_are_dropped():
+    agent = make_agent(tool_response_keep=20)
+    bulky = {"role": "user", "content": tool_response(" ".join(["word"] * 500))}
+    agent._append_message(bulky)
+    agent._append_message({"role": "user", "content": "latest question"})
+    agent.token_limit = agent.total_token_count - 100
+    agent._truncate_context_window()
+
+    assert len(agent.messages) == 3
+    assert "[truncated " in agent.messages[1]["content"]
+    assert agent.messages[2]["content"] == "latest question"
+    assert agent.total_token_count == sum(
+        _count_message_tokens(m, agent._encoding) for m in agent.messages
+    )
+
+
+def test_truncation_keeps_the_system_and_last_messages():
+    agent = make_agent()
+    system = agent.messages[0]
+    for i in range(5):
+        agent._append_message({"role": "user", "content": f"message {i} " * 20})
+    agent.token_limit = _count_message_tokens(system, agent._encoding) + 50
+    agent._truncate_context_window()
+
+    assert agent.messages[0] is system
+    assert agent.messages[-1]["content"].startswith("message 4")
+    assert len(agent.messages) == 2
@@ -0,0 +1,47 @@
+import pytest
+
+from _fakes import EchoTool, collect, make_agent, split_every, text_of
+
+RESPONSES = [
+    "Just text, no markup at all.",
+    "Use <b>bold</b> for emphasis. Now: <echo>\n<text>hello</text>\n</echo>",
+    "",
+]
+
+
+def events_of(events):
+    """Return the shown text and the other events; text may arrive in any split."""
+    return text_of(events), [
+        (e.type, e.content) for e in events if e.type != "response"
+    ]
+
+
+@pytest.mark.parametrize("response", RESPONSES)
+def test_cache_hit_replays_the_same_events(response):
+    cache = {}
+    live = make_agent(
+        split_every(response, 3), tools=[EchoTool()], response_cache=cache
+    )
+    live_events = collect(live)
+    replay = make_agent(tools=[EchoTool()], response_cache=cache)
+    replay_events = collect(replay)
+
+    assert live.requests == 1
+    assert replay.requests == 0
+    assert events_of(replay_events) == events_of(live_events)
+
+
+def test_empty_cached_response_yields_no_text_event():
+    cache = {}
+    collect(make_agent([], response_cache=cache))
+    replay = make_agent(response_cache=cache)
+    assert collect(replay) == []
+    assert replay.requests == 0
+
+
+def test_cache_is_keyed_by_endpoint():
+    cache = {}
+    collect(make_agent(["from A"], response_cache=cache, base_url="http://a.test/v1"))
+    other = make_agent(["from B"], response_cache=cache, base_url="http://b.test/v1")
+    assert [e.content for e in collect(other)] == ["from B"]
+    assert other.requests == 1
@@ -0,0 +1,16 @@
+import asyncio
+
+import pytest
+
+from se_agents.runner import run_with_uvloop
+
+
+def test_run_with_uvloop_leaves_the_loop_policy_alone():
+    uvloop = pytest.importorskip("uvloop")
+    policy = asyncio.get_event_loop_policy()
+
+    async def loop_type():
+        return type(asyncio.get_running_loop())
+
+    assert run_with_uvloop(loop_type()) is uvloop.Loop
+    assert asyncio.get_event_loop_policy() is policy
@@ -0,0 +1,116 @@
+import re
+
+import pytest
+
+from _fakes import (
+    EchoTool,
+    SayTool,
+    collect,
+    make_agent,
+    split_every,
+    split_randomly,
+    text_of,
+)
+
+from se_agents._stream_parser import TEXT, TOOL_CALL, StreamScanner
+
+# Prose containing '<' followed by a tool call
+PROSE_THEN_TOOL = [
+    "Use <b>bold</b> for emphasis, and remember that a < b holds here. "
+    "Now: <echo>\n<text>hello</text>\n</echo>",
+    # Gap between the stray '<' and the tool tag shorter than the tag itself
+    "a<b <echo>\n<text>hello</text>\n</echo>",
+]
+
+
+def run_chunks(chunks):
+    events = collect(make_agent(chunks, tools=[EchoTool()]))
+    tool_calls = [(e.tool_name, e.parameters) for e in events if e.type == "tool_call"]
+    return text_of(events), tool_calls
+
+
+def splits(text):
+    yield [text]
+    yield list(text)
+    for size in (4, 100, 1000):
+        yield split_every(text, size)
+    for seed in range(20):
+        yield split_randomly(text, seed)
+
+
+@pytest.mark.parametrize("text", PROSE_THEN_TOOL)
+def test_events_do_not_depend_on_chunking(text):
+    expected = (text[: text.index("<echo>")], [("echo", {"text": "hello"})])
+    for chunks in splits(text):
+        assert run_chunks(chunks) == expected, chunks
+
+
+def test_scanner_resumes_after_a_tool_call():
+    scanner = StreamScanner(re.compile(r"<(/?)(echo)>"), {}, len("</echo>"))
+    events = []
+    for chunk in ["hi <echo><text>x</text></echo> after", " more < text", " done"]:
+        events += scanner.feed(chunk)
+
+    assert [kind for kind, _ in events] == [TEXT, TOOL_CALL, TEXT, TEXT, TEXT]
+    assert events[1][1].raw_xml == "<echo><text>x</text></echo>"
+    assert "".join(p for kind, p in events if kind == TEXT) == (
+        "hi  after more < text done"
+    )
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Plain prose without any markup.",
+        "If a < b and c > d, wrap it in <b>bold</b> and end with <",
+    ],
+)
+def test_text_without_tool_calls_is_shown_as_is(text):
+    for chunks in splits(text):
+        events = collect(make_agent(chunks, tools=[EchoTool()]))
+        assert text_of(events) == text, chunks
+        assert all(e.type == "response" for e in events)
+
+
+def test_text_passes_through_unchanged_without_tools():
+    chunks = ["a <b", "> c", " d"]
+    events = collect(make_agent(chunks))
+    assert [e.content for e in events] == chunks
+
+
+def test_stream_parameter_is_shown_while_the_call_streams():
+    text = (
+        "Hi <say>\n<message_to_user>Hello there, this is streamed."
+        "</message_to_user>\n</say>"
+    )
+    for chunks in splits(text):
+        events = collect(make_agent(chunks, tools=[SayTool()]))
+        assert text_of(events) == "Hi Hello there, this is streamed.", chunks
+        assert events[-1].type == "tool_call"
+        assert events[-1].parameters == {
+            "message_to_user": "Hello there, this is streamed."
+        }
+
+
+def test_unclosed_tool_call_is_reported_with_its_block():
+    for chunks in splits("Sure. <echo>\n<text>abc"):
+        events = collect(make_agent(chunks, tools=[EchoTool()]))
+        assert text_of(events) == "Sure. "
+        error = events[-1]
+        assert error.type == "tool_error"
+        assert "Closing tag not found" in error.error_message
+        assert error.raw_xml == "<echo>\n<text>abc"
+
+
+def test_malformed_tool_call_is_reported():
+    events = collect(
+        make_agent(["<echo><text>a & b</text></echo>"], tools=[EchoTool()])
+    )
+    assert [e.type for e in events] == ["tool_error"]
+    assert events[0].error_message.startswith("Malformed XML for tool call echo")
+
+
+def test_missing_required_parameter_is_reported():
+    events = collect(make_agent(["<echo>\n</echo>"], tools=[EchoTool()]))
+    assert [e.type for e in events] == ["tool_error"]
+    assert "Missing required parameters for echo: text" in events[0].error_message
@@ -0,0 +1,121 @@
+import asyncio
+
+from _fakes import EchoTool, make_agent
+
+import se_agents.agent
+
+
+def execute(agent, *calls):
+    """Run the tool calls in order and return their results."""
+
+    async def run():
+        return [await agent._execute_tool("echo", {"text": t}) for t in calls]
+
+    return asyncio.run(run())
+
+
+def test_cacheable_tool_result_is_reused():
+    tool = EchoTool(cacheable=True)
+    agent = make_agent(tools=[tool], tool_cache_epsilon=0)
+    assert execute(agent, "a", "a", "b") == [("a", True), ("a", True), ("b", True)]
+    assert tool.calls == 2
+
+
+def test_uncacheable_tool_always_runs():
+    tool = EchoTool()
+    agent = make_agent(tools=[tool], tool_cache_epsilon=0)
+    execute(agent, "a", "a")
+    assert tool.calls == 2
+
+
+def test_tool_cache_drops_the_least_recently_used_result():
+    tool = EchoTool(cacheable=True)
+    agent = make_agent(tools=[tool], tool_cache_epsilon=0, tool_cache_size=2)
+    # "a" is used again before "c" arrives, so "b" is the one dropped
+    execute(agent, "a", "b", "a", "c")
+    assert tool.calls == 3
+    execute(agent, "a", "c")
+    assert tool.calls == 3
+    execute(agent, "b")
+    assert tool.calls == 4
+
+
+def test_cached_result_expires_after_its_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(se_agents.agent.time, "time", lambda: now[0])
+    tool = EchoTool(cacheable=True, cache_ttl=10)
+    agent = make_agent(tools=[tool], tool_cache_epsilon=0)
+    execute(agent, "a")
+    now[0] += 9
+    execute(agent, "a")
+    assert tool.calls == 1
+    now[0] += 2
+    execute(agent, "a")
+    assert tool.calls == 2
+
+
+def test_epsilon_of_one_always_reruns_the_tool():
+    tool = EchoTool(cacheable=True)
+    agent = make_agent(tools=[tool], tool_cache_epsilon=1)
+    execute(agent, "a", "a", "a")
+    assert tool.calls == 3
+
+
+def test_failed_calls_are_not_cached():
+    tool = EchoTool(cacheable=True)
+    agent = make_agent(tools=[tool], tool_cache_epsilon=0)
+
+    async def run():
+        return await agent._execute_tool("echo", {})
+
+    assert asyncio.run(run())[1] is False
+    assert not agent._tool_cache
+
+
+def test_removing_a_tool_drops_its_cached_results():
+    tool = EchoTool(cacheable=True)
+    agent = make_agent(tools=[tool], tool_cache_epsilon=0)
+    execute(agent, "a")
+    agent.remove_tool("echo")
+    assert not agent._tool_cache
+
+
+def stream_then_execute(agent, text):
+    """Stream one turn, then execute echo with the given text as run() would."""
+
+    async def run():
+        events = [event async for event in agent.run_stream("hi")]
+        task = agent._prefetch[2] if agent._prefetch else None
+        result = await agent._execute_tool("echo", {"text": text})
+        await asyncio.sleep(0)
+        return events, task, result
+
+    return asyncio.run(run())
+
+
+def test_prefetched_run_is_claimed_by_the_matching_call():
+    tool = EchoTool(prefetch=True)
+    agent = make_agent(["<echo><text>hi</text>", "\n</echo>"], tools=[tool])
+    events, task, result = stream_then_execute(agent, "hi")
+
+    assert events[-1].type == "tool_call"
+    assert task is not None
+    assert result == ("hi", True)
+    assert tool.calls == 1
+    assert agent._prefetch is None
+
+
+def test_prefetched_run_is_cancelled_when_the_call_differs():
+    tool = EchoTool(prefetch=True)
+    agent = make_agent(["<echo><text>hi</text>", "\n</echo>"], tools=[tool])
+    _, task, result = stream_then_execute(agent, "bye")
+
+    assert task.cancelled()
+    assert result == ("bye", True)
+    assert agent._prefetch is None
+
+
+def test_tool_without_prefetch_waits_for_the_call():
+    agent = make_agent(["<echo><text>hi</text>", "\n</echo>"], tools=[EchoTool()])
+    _, task, _ = stream_then_execute(agent, "hi")
+    assert task is None